@@ -1,7 +1,17 @@
-import json
+import collections
+import functools
+import heapq
+import itertools
+import queue
+import re
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import ahocorasick
+import orjson
 import pyaudio
 from vosk import Model, KaldiRecognizer
-from typing import Dict, Set, Callable, Optional
+from typing import Dict, List, Tuple, Union, Callable, Optional
 
 import os
 from pathlib import Path
@@ -12,9 +22,24 @@ import time
 
 
 class SpeechMonitor:
+    # Lowest-latency PortAudio host APIs per platform, in order of preference
+    LOW_LATENCY_HOST_APIS = {
+        "win32": (pyaudio.paWASAPI,),
+        "linux": (pyaudio.paALSA,),
+        "darwin": (pyaudio.paCoreAudio,),
+    }
+
+    # Seconds of audio gathered before each call into the decoder
+    SLAB_SECONDS = 0.1
+
+    # Most audio kept waiting for the decoder; older chunks are dropped so
+    # late speech never turns into late key presses
+    MAX_BACKLOG_SECONDS = 0.3
+
     def __init__(self, model_path: str, forbidden_words: set, 
-                 sample_rate: int = 16000, buffer_size: int = 4096,
-                 warning_text :str ='\033[1;31m', reset_text :str ='\033[0m'):
+                 sample_rate: int = 16000, buffer_size: int = 1024,
+                 warning_text :str ='\033[1;31m', reset_text :str ='\033[0m',
+                 history_size: int = 2048):
         """
         Initialize the speech monitor with configuration settings.
         
@@ -23,31 +48,113 @@ class SpeechMonitor:
             forbidden_words: Dictionary of words to monitor with initial detection status
             sample_rate: Audio sample rate
             buffer_size: Audio buffer size
+            history_size: Number of recognized lines kept for output_audio
         """
         self.MODEL_PATH = model_path
         self.SAMPLE_RATE = sample_rate
         self.BUFFER_SIZE = buffer_size
-        self.FORBIDDEN_WORDS = forbidden_words.copy()
-        self.detected_words: Set[str] = set()
+        # Lower-cased and interned, so matches and callback keys share one
+        # string object with a cached hash. Blank words can never be spoken.
+        self.FORBIDDEN_WORDS = frozenset(
+            sys.intern(word.lower()) for word in forbidden_words if word.strip()
+        )
         self.WARNING_TEXT = warning_text
         self.RESET_TEXT = reset_text
 
-        self.audio_list = []
+        self.audio_list: collections.deque = collections.deque(maxlen=history_size)
+
+        # Raw audio chunks pushed by the PortAudio callback, bounded to
+        # MAX_BACKLOG_SECONDS of audio
+        backlog_chunks = max(1, round(sample_rate * self.MAX_BACKLOG_SECONDS / buffer_size))
+        self._audio_queue: queue.Queue = queue.Queue(maxsize=backlog_chunks)
+        self.input_overflows = 0  # Chunks PortAudio flagged as overflowed
+        self.dropped_chunks = 0  # Chunks discarded because the decoder fell behind
+
+        # Recognizer results handed from the recognition thread to monitor_speech
+        self._result_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._recognition_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
 
         # Audio stream components
         self.recognizer: Optional[KaldiRecognizer] = None
+        self._recognizer_future: Optional[Future] = None
         self.stream: Optional[pyaudio.Stream] = None
         self.mic: Optional[pyaudio.PyAudio] = None
         
-        # Callback management
+        # Callback management. Callbacks run on worker threads so key presses
+        # that sleep never stall recognition.
         self.callbacks: Dict[str, Callable] = {}
+        self._callback_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speech-callback")
+
+        # Terminal output is written by a single worker, in order, so a slow
+        # console never holds up matching
+        self._print_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speech-print")
+
+        # Space-padded forms of the forbidden words, computed once instead of
+        # on every utterance
+        self._fw_padded = [(" " + word + " ", word) for word in self.FORBIDDEN_WORDS]
+
+        # Aho-Corasick automaton over the forbidden words, built once so each
+        # utterance is matched in a single pass in partial mode. Each word
+        # maps to itself and its bit in the per-utterance dedup bitset.
+        # None when the vocabulary is empty.
+        self._ac = self._build_automaton(
+            [(word, (word, 1 << i)) for i, word in enumerate(self.FORBIDDEN_WORDS)]
+        )
+
+        # Full mode runs a scanner generated for this fixed vocabulary: one
+        # substring test per padded word against the padded line
+        self._scan_full = self._compile_scanner(self._fw_padded)
+
+        # Highlighting patterns for _info, longest words first so the
+        # alternation prefers the longest match. Full mode only highlights
+        # whitespace-delimited words, exactly like _scan_full detects them.
+        # An empty vocabulary gets a pattern that never matches.
+        alternation = '|'.join(map(re.escape, sorted(self.FORBIDDEN_WORDS, key=len, reverse=True))) or '(?!)'
+        self._full_re = re.compile(r'(?<!\S)(' + alternation + r')(?!\S)', re.IGNORECASE)
+        self._partial_re = re.compile('(' + alternation + ')', re.IGNORECASE)
+
+        # Characters (either case) that start a forbidden word; a sentence
+        # containing none of them cannot need highlighting
+        self._trigger_chars = frozenset(
+            c for word in self.FORBIDDEN_WORDS if word for c in (word[0], word[0].upper())
+        )
         
+    @staticmethod
+    def _build_automaton(keys: list) -> Optional[ahocorasick.Automaton]:
+        """Build an Aho-Corasick automaton from (key, value) pairs, or None without any keys."""
+        automaton = ahocorasick.Automaton()
+        for key, value in keys:
+            automaton.add_word(key, value)
+        automaton.make_automaton()
+
+        # make_automaton() leaves an automaton without words unusable for iter()
+        if automaton.kind != ahocorasick.AHOCORASICK:
+            return None
+        return automaton
+
+    @staticmethod
+    def _compile_scanner(keys: list) -> Callable[[str, Callable[[str], None]], None]:
+        """Generate a function calling hit(word) for every (key, word) pair whose key is in a line."""
+        body = [
+            f"    if {key!r} in line: hit({word!r})"
+            for key, word in keys if key.strip()
+        ]
+        source = "def _scan(line, hit):\n" + "\n".join(body or ["    pass"]) + "\n"
+
+        namespace: dict = {}
+        exec(compile(source, "<forbidden-word-scanner>", "exec"), namespace)
+        return namespace["_scan"]
+
     def initialize_audio_stream(self) -> None:
         """Initialize the audio stream and Vosk recognizer."""
         try:
-            model = Model(self.MODEL_PATH)
-            self.recognizer = KaldiRecognizer(model, self.SAMPLE_RATE)
-            
+            # Load the model in the background while the microphone opens;
+            # monitor_speech waits for it before listening
+            loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vosk-model")
+            self._recognizer_future = loader.submit(self._create_recognizer)
+            loader.shutdown(wait=False)
+
             self.mic = pyaudio.PyAudio()
             self.stream = self.mic.open(
                 format=pyaudio.paInt16,
@@ -55,74 +162,220 @@ class SpeechMonitor:
                 rate=self.SAMPLE_RATE,
                 input=True,
                 frames_per_buffer=self.BUFFER_SIZE,
-                input_device_index=0
+                input_device_index=self._select_input_device(),
+                stream_callback=self._audio_callback,
+                start=True
             )
 
         except Exception as e:
-            print(f"Initialization failed: {e}")
+            self._write(f"Initialization failed: {e}")
             raise
 
+    def _wait_for_recognizer(self) -> None:
+        """Block until the model has loaded, re-raising any load failure."""
+        while True:
+            try:
+                # Wake up periodically so Ctrl+C is handled on Windows too
+                self._recognizer_future.result(timeout=0.5)
+                return
+            except FutureTimeoutError:
+                continue
+            except Exception as e:
+                self._write(f"Initialization failed: {e}")
+                raise
+
+    def _discard_queued_audio(self) -> None:
+        """Drop every chunk currently waiting for the decoder."""
+        try:
+            while True:
+                self._audio_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _create_recognizer(self) -> KaldiRecognizer:
+        """Load the Vosk model and build the recognizer."""
+        self._prefetch_model_files()
+        model = Model(self.MODEL_PATH)
+        recognizer = KaldiRecognizer(model, self.SAMPLE_RATE)
+        # Only the transcript is used, so skip word timings and alternatives
+        recognizer.SetWords(False)
+        recognizer.SetPartialWords(False)
+        recognizer.SetMaxAlternatives(0)
+
+        self.recognizer = recognizer
+        return recognizer
+
+    def _prefetch_model_files(self) -> None:
+        """Ask the OS to start reading the model files into the page cache."""
+        if not hasattr(os, "posix_fadvise"):
+            return
+
+        for path in Path(self.MODEL_PATH).rglob("*"):
+            if not path.is_file():
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass  # Only a hint; Model() reports unreadable files
+
+    def _select_input_device(self) -> Optional[int]:
+        """Return the default input of the lowest-latency host API that supports our format."""
+        for host_api in self.LOW_LATENCY_HOST_APIS.get(sys.platform, ()):
+            try:
+                device = self.mic.get_host_api_info_by_type(host_api)["defaultInputDevice"]
+                if device < 0:
+                    continue
+                self.mic.is_format_supported(
+                    self.SAMPLE_RATE,
+                    input_device=device,
+                    input_channels=1,
+                    input_format=pyaudio.paInt16
+                )
+            except (OSError, ValueError):
+                # Host API missing, or it cannot capture at our sample rate
+                continue
+            return device
+
+        return None  # Fall back to PortAudio's default input device
+
+    def _audio_callback(self, in_data: bytes, frame_count: int, time_info: dict, status: int):
+        """PortAudio callback: hand the captured chunk over to monitor_speech."""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        self._enqueue_audio(in_data)
+        return None, pyaudio.paContinue
+
+    def _enqueue_audio(self, data: bytes) -> None:
+        """Queue a chunk for the decoder, dropping the oldest one when the backlog is full."""
+        try:
+            self._audio_queue.put_nowait(data)
+            return
+        except queue.Full:
+            pass
+
+        try:
+            self._audio_queue.get_nowait()
+            self.dropped_chunks += 1
+        except queue.Empty:
+            pass
+        try:
+            self._audio_queue.put_nowait(data)
+        except queue.Full:
+            self.dropped_chunks += 1
+
     def register_callback(self, word: str, callback: Callable[..., None]) -> None:
         """Register a callback for the accepted word."""
-        self.callbacks[word] = callback
+        self.callbacks[sys.intern(word.lower())] = callback
 
 
     def _execute_callbacks(self, word: str) -> None:
         """Execute the appropriate callback for a detected word."""
         callback = self.callbacks.get(word)
         if callback:
-            callback()
+            future = self._callback_executor.submit(callback)
+            future.add_done_callback(self._report_callback_error)
+
+    def _report_callback_error(self, future: Future) -> None:
+        """Print exceptions raised by callbacks running on the executor."""
+        error = future.exception()
+        if error is not None:
+            self._write(f"Callback failed: {error}")
     
     def _info(self, current_sentence:str,mode:str = "full") -> None:
         """Prints the sentence with forbidden word fragments highlighted."""
+        if self._trigger_chars.isdisjoint(current_sentence):
+            output = current_sentence
+        else:
+            pattern = self._full_re if mode == "full" else self._partial_re
+            output = pattern.sub(self._highlight, current_sentence)
 
+        self._write(output)
 
-        words = current_sentence.split()
-        for i, word in enumerate(words):
-            lower_word = word.lower()
-            for forbidden in self.FORBIDDEN_WORDS:
-                if forbidden in lower_word:
-                    if (lower_word == forbidden.lower()) and (mode == "full"):
-                    # Highlight the entire word
-                        words[i] = f"{self.WARNING_TEXT}{word}{self.RESET_TEXT}"
-                        break
-                    # Highlight only the forbidden portion
-                    if (mode == "partial"):
-                        words[i] = word.replace(
-                            forbidden, 
-                            f"{self.WARNING_TEXT}{forbidden}{self.RESET_TEXT}"
-                        )
-                        break
-
-        print(' '.join(words))  # Print reconstructed sentence
+    def _write(self, line: str) -> None:
+        """Write a line from the print worker so all output stays in order."""
+        try:
+            future = self._print_executor.submit(sys.stdout.write, line + "\n")
+        except RuntimeError:
+            print(line)  # The worker is already shut down by cleanup
+            return
+        future.add_done_callback(self._report_write_error)
+
+    @staticmethod
+    def _report_write_error(future: Future) -> None:
+        """Report a failed terminal write on stderr, since stdout itself failed."""
+        error = future.exception()
+        if error is not None:
+            sys.stderr.write(f"Output failed: {error}\n")
+
+    def _highlight(self, match: re.Match) -> str:
+        """Wrap a regex match in the warning colour codes."""
+        return f"{self.WARNING_TEXT}{match.group(0)}{self.RESET_TEXT}"
 
     def _process_partial_result_and_full_result(self, text: str, mode: str) -> str:
         """Process a complete sentence mode and partial mode."""
         
         current_line = text.lower()
-        new_detections = set()
-        self.detected_words.clear()  # Reset for next utterance
-
-        for word in self.FORBIDDEN_WORDS:
-            if " "+ word + " " in  " " + current_line +" " and word and mode == "full" not in self.detected_words:
-                new_detections.add(word)
-                self._execute_callbacks(word)
-                
 
-            if word in current_line and word and mode == "partial" not in self.detected_words:
-                new_detections.add(word)
+        if mode == "full":
+            # The generated scanner tests each word once, so hits are already unique
+            self._scan_full(f" {current_line} ", self._execute_callbacks)
+        elif self._ac is not None:
+            # A word can match several times; fire it only on its first match
+            seen = 0
+            for _, (word, bit) in self._ac.iter(current_line):
+                if seen & bit:
+                    continue
+                seen |= bit
                 self._execute_callbacks(word)
-                
-        if new_detections:
-            self.detected_words.update(new_detections)
-            
 
         return current_line
   
   
-    def output_audio(self) -> list:
-        
-        return self.audio_list.copy()    
+    def output_audio(self) -> Tuple[str, ...]:
+        """Return an immutable snapshot of the recognized lines."""
+        return tuple(self.audio_list)
+
+    def _recognize_loop(self) -> None:
+        """Feed captured audio to Vosk and queue each finalized result."""
+        self._raise_thread_priority()
+
+        # Chunks are gathered into ~100 ms slabs (16-bit mono samples) so
+        # the decoder runs on fewer, larger buffers while capture continues
+        slab = bytearray()
+        slab_size = int(self.SAMPLE_RATE * self.SLAB_SECONDS) * 2
+        try:
+            recognizer = self._recognizer_future.result()
+            # Drop whatever the bounded queue kept from before the model was
+            # ready, so only speech from after "Listening" triggers callbacks
+            self._discard_queued_audio()
+
+            while not self._stop_event.is_set():
+                slab.extend(self._audio_queue.get())
+                if len(slab) < slab_size:
+                    continue
+
+                data = bytes(slab)
+                slab.clear()
+                if recognizer.AcceptWaveform(data):
+                    self._result_queue.put(orjson.loads(recognizer.Result()))
+        except Exception as e:
+            # Surface the failure on the monitor_speech thread
+            self._result_queue.put(e)
+
+    @staticmethod
+    def _raise_thread_priority() -> None:
+        """Move the calling thread to a real-time policy where the OS allows it."""
+        if not hasattr(os, "sched_setscheduler"):
+            return
+        try:
+            priority = os.sched_get_priority_min(os.SCHED_RR)
+            os.sched_setscheduler(0, os.SCHED_RR, os.sched_param(priority))
+        except OSError:
+            pass  # Needs CAP_SYS_NICE; keep the default policy
 
     def monitor_speech(self, mode: str):
         """
@@ -132,51 +385,143 @@ class SpeechMonitor:
             mode: Detection mode ('full', 'partial')
         """
 
-        if not all([self.recognizer, self.stream, self.mic]):
-            self.initialize_audio_stream()
-            # Validate mode first
-
+        # Validate mode first
         if mode not in ("full", "partial"):
             raise ValueError(f"Invalid mode: {mode}. Use 'full', 'partial'")
 
+        if not all([self._recognizer_future, self.stream, self.mic]):
+            self.initialize_audio_stream()
+
+        try:
+            self._wait_for_recognizer()
+        except BaseException:
+            self.cleanup()
+            raise
 
-        print(f"Listening for forbidden words -> mode... (Press Ctrl+C to stop)")
+        self._write(f"Listening for forbidden words -> mode... (Press Ctrl+C to stop)")
         
         current_line = ""
 
+        # The mode is fixed for the session, so bind it once
+        process_line = functools.partial(self._process_partial_result_and_full_result, mode=mode)
+        info = functools.partial(self._info, mode=mode)
+
+        self._stop_event.clear()
+        self._recognition_thread = threading.Thread(
+            target=self._recognize_loop, name="speech-recognition", daemon=True
+        )
+        self._recognition_thread.start()
+
         try:
             while True:
-                data = self.stream.read(self.BUFFER_SIZE, exception_on_overflow=False)
-                
+                try:
+                    # Wake up periodically so Ctrl+C is handled on Windows too
+                    result = self._result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if isinstance(result, Exception):
+                    raise result
 
-                # Process audio data
-                if self.recognizer.AcceptWaveform(data):
-                    result = json.loads(self.recognizer.Result())
-                    if "text" in result:
-                        if mode in ("full"):
-                            current_line = self._process_partial_result_and_full_result(result["text"], mode)
-                        if mode in ("partial"):
-                            current_line = self._process_partial_result_and_full_result(result["text"], mode)
+                if "text" in result:
+                    current_line = process_line(result["text"])
 
-                    self.audio_list.append(current_line)
-                    self._info(current_line,mode)
+                self.audio_list.append(current_line)
+                info(current_line)
 
-        
         except KeyboardInterrupt:
-            print("\nStopping...")
+            self._write("\nStopping...")
         except Exception as e:
-            print(f"Error during processing: {e}")
+            self._write(f"Error during processing: {e}")
         finally:
             self.cleanup()
 
     def cleanup(self) -> None:
         """Clean up audio resources."""
+        # Stop capture first so teardown does not count as dropped audio
         if self.stream:
             self.stream.stop_stream()
+
+        self._stop_event.set()
+        try:
+            self._audio_queue.put_nowait(b"")  # Wake the recognition thread
+        except queue.Full:
+            pass  # A full queue wakes it anyway
+        if self._recognition_thread:
+            self._recognition_thread.join(timeout=1)
+        self._callback_executor.shutdown(wait=False)
+        if self.input_overflows or self.dropped_chunks:
+            self._write(f"Audio input overflowed {self.input_overflows} times; "
+                        f"dropped {self.dropped_chunks} chunks the decoder could not keep up with")
+        # Flush everything queued for the terminal before tearing down
+        self._print_executor.shutdown(wait=True)
+        if self.stream:
             self.stream.close()
         if self.mic:
             self.mic.terminate()
 
+class KeyHoldScheduler:
+    """Holds keys down for a while without blocking the caller."""
+
+    def __init__(self, keyboard: KeyboardController):
+        self.keyboard = keyboard
+        # Min-heap of (time, sequence, press, key) events; the sequence breaks
+        # ties between keys that are not comparable with each other
+        self._events: List[Tuple[float, int, bool, Union[str, Key]]] = []
+        # Holds currently pressing each key; it is released when none remain
+        self._active_holds: Dict[Union[str, Key], int] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+        threading.Thread(target=self._event_loop, name="key-hold", daemon=True).start()
+
+    def hold(self, key: Union[str, Key], duration: float, delay: float = 0.0) -> None:
+        """Press the key after delay seconds and release it duration seconds later."""
+        press_time = time.monotonic() + delay
+        release_time = press_time + duration
+        with self._condition:
+            if delay > 0:
+                heapq.heappush(self._events, (press_time, next(self._sequence), True, key))
+            else:
+                self._press(key)
+            heapq.heappush(self._events, (release_time, next(self._sequence), False, key))
+            self._condition.notify()
+
+    def _event_loop(self) -> None:
+        """Press and release keys as their scheduled times pass."""
+        with self._condition:
+            while True:
+                if not self._events:
+                    self._condition.wait()
+                    continue
+
+                event_time, _, press, key = self._events[0]
+                delay = event_time - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                heapq.heappop(self._events)
+                if press:
+                    self._press(key)
+                else:
+                    self._release(key)
+
+    def _press(self, key: Union[str, Key]) -> None:
+        """Start a hold, pressing the key unless another hold already has it down."""
+        holds = self._active_holds.get(key, 0)
+        if holds == 0:
+            self.keyboard.press(key)
+        self._active_holds[key] = holds + 1
+
+    def _release(self, key: Union[str, Key]) -> None:
+        """End a hold, releasing the key once no other hold needs it."""
+        holds = self._active_holds[key] - 1
+        if holds:
+            self._active_holds[key] = holds
+        else:
+            del self._active_holds[key]
+            self.keyboard.release(key)
+
 def get_config():
     """Returns config with environment-aware paths"""
     config = {
@@ -205,59 +550,36 @@ if __name__ == "__main__":
     monitor = SpeechMonitor(**CONFIG)
     keyboard = KeyboardController()
     
+    scheduler = KeyHoldScheduler(keyboard)
+    
     # Register custom callbacks
     def forward_callback():
-        keyboard.press('w')
-        time.sleep(3)
-        keyboard.release('w')
+        scheduler.hold('w', 3)
     
     def backward_callback():
-        keyboard.press('s')
-        time.sleep(3)
-        keyboard.release('s')
+        scheduler.hold('s', 3)
 
     def left_callback():
-        keyboard.press('a')
-        time.sleep(3)
-        keyboard.release('a')
+        scheduler.hold('a', 3)
 
     def right_callback():
-        keyboard.press('d')
-        time.sleep(3)
-        keyboard.release('d')
+        scheduler.hold('d', 3)
 
     def dash_forward_callback():
-        keyboard.press('w')       
-        time.sleep(0.1)           
-        keyboard.press(Key.space) 
-        time.sleep(0.2)           
-        keyboard.release(Key.space) 
-        time.sleep(0.1)           
-        keyboard.release('w')
+        scheduler.hold('w', 0.4)
+        scheduler.hold(Key.space, 0.2, delay=0.1)
 
     def enter_callback():
-        keyboard.press('e')
-        time.sleep(0.2)
-        keyboard.release('e')
-        time.sleep(0.1) 
+        scheduler.hold('e', 0.2)
     
     def attack_callback():
-        keyboard.press('p')
-        time.sleep(0.2)
-        keyboard.release('p')
-        time.sleep(0.1) 
+        scheduler.hold('p', 0.2)
     
     def drink_callback():
-        keyboard.press('r')
-        time.sleep(0.2)
-        keyboard.release('r')
-        time.sleep(0.1) 
+        scheduler.hold('r', 0.2)
     
     def lock_callback():
-        keyboard.press('q')
-        time.sleep(0.2)
-        keyboard.release('q')
-        time.sleep(0.1) 
+        scheduler.hold('q', 0.2)
 
         
 